@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 from abc import ABCMeta, abstractmethod
+from array import array
 from enum import EnumMeta
 from collections.abc import Iterator, Iterable, Sequence, Mapping
 from typing import Type, TypeVar, Generic
@@ -18,7 +19,8 @@ __all__ = (
     "main",
     "AbstractEnumMeta",
     "AbstractInstruction",
-    "AbstractMachine"
+    "AbstractMachine",
+    "InputBuffer"
 )
 
 T = TypeVar("T")
@@ -41,23 +43,28 @@ class AbstractInstruction(Generic[T], metaclass=ABCMeta):
     @classmethod
     def parse_program(cls, source: str) -> Iterator[T]:
         """parse a program consisting of multiple lines"""
+        parse = cls.parse
         for number, line in enumerate(source.split("\n"), start=1):
+            # leading whitespace is not stripped since it is invalid
             line = line.rstrip()
-            if line.endswith(";"):
-                try:
-                    instruction = cls.parse(line[:-1])
-                except KeyError as error:
-                    raise ValueError(f"invalid instruction at line {number}") from error
-                except ValueError as error:
-                    raise ValueError(f"invalid payload at line {number}") from error
-                except Exception as error:
-                    raise ValueError(f"error while parsing line {number}") from error
-                else:
-                    yield instruction
-            elif line:
-                raise ValueError(f"missing semicolon on line {number}")
-            else:
+            if not line:
                 continue
+            elif line[-1] != ";":
+                raise ValueError(f"missing semicolon on line {number}")
+            try:
+                instruction = parse(line[:-1])
+            except KeyError as error:
+                raise ValueError(f"invalid instruction at line {number}") from error
+            except ValueError as error:
+                raise ValueError(f"invalid payload at line {number}") from error
+            except Exception as error:
+                raise ValueError(f"error while parsing line {number}") from error
+            yield instruction
+
+    @classmethod
+    def compile_program(cls, source: str) -> Sequence[T]:
+        """parse a program into a form ready for execution"""
+        return tuple(cls.parse_program(source))
 
 
 class AbstractMachine(Generic[I], metaclass=ABCMeta):
@@ -67,6 +74,8 @@ class AbstractMachine(Generic[I], metaclass=ABCMeta):
 
     counter: int
 
+    input: Iterator[int]
+
     @classmethod
     @abstractmethod
     def default(cls: Type[T], input: Iterator[int]) -> T:
@@ -93,7 +102,45 @@ class AbstractMachine(Generic[I], metaclass=ABCMeta):
         while 0 < self.counter <= len(program):
             yield self.execute_instruction(program[self.counter - 1])
 
+    def run_batch(self, program: Sequence[I], output: list[int]) -> None:
+        """execute a program until it halts, appending the produced values to output"""
+        for value in self.execute_program(program):
+            if value is not None:
+                output.append(value)
+
     @abstractmethod
     def reset(self) -> None:
         """reset the machine to the default state"""
         raise NotImplementedError()
+
+
+class InputBuffer(Iterator[int]):
+    """input read in advance, consumed by advancing a position instead of calling an iterator"""
+
+    __slots__ = ("values", "position")
+
+    values: array[int] | list[int]
+
+    position: int
+
+    def __init__(self, values: Iterable[int], position: int = 0) -> None:
+        values = list(values)
+        try:
+            self.values = array("q", values)
+        except OverflowError:
+            # keep inputs which do not fit as Python integers
+            self.values = values
+        self.position = position
+
+    def __next__(self) -> int:
+        position = self.position
+        try:
+            value = self.values[position]
+        except IndexError:
+            raise StopIteration() from None
+        self.position = position + 1
+        return value
+
+    def remaining(self) -> Sequence[int]:
+        """return the values which have not been consumed yet"""
+        return self.values[self.position:]
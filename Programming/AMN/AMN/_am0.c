@@ -0,0 +1,502 @@
+/*
+ * Native execution of AM0 programs on 64 bit integer buffers.
+ *
+ * This module implements the same interface as AMN.am0._execute and
+ * is used by AMN.am0.Machine.run_batch if it is available.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+
+/* instruction values, see AMN.am0.Instruction and AMN.am0._HALT */
+enum {
+    HALT = 0,
+    ADD = 1,
+    MUL = 2,
+    SUB = 3,
+    DIV = 4,
+    MOD = 5,
+    EQ = 6,
+    NE = 7,
+    LT = 8,
+    GT = 9,
+    LE = 10,
+    GE = 11,
+    LOAD = 12,
+    STORE = 13,
+    LIT = 14,
+    JMP = 15,
+    JMC = 16,
+    WRITE = 17,
+    READ = 18
+};
+
+/* superinstructions, see AMN.am0._fuse */
+#define IMMEDIATE 32
+#define INCREMENT 64
+
+/* indices into the registers */
+enum {
+    INDEX = 0,
+    TOP = 1,
+    OUTPUT = 2,
+    INPUT = 3,
+    DEFINED = 4
+};
+
+#if defined(__GNUC__) || defined(__clang__)
+#define USE_COMPUTED_GOTO 1
+#else
+#define USE_COMPUTED_GOTO 0
+#endif
+
+/* arithmetic returning nonzero on overflow */
+
+static inline int add_overflow(int64_t left, int64_t right, int64_t *result) {
+#if defined(__GNUC__) || defined(__clang__)
+    return __builtin_add_overflow(left, right, result);
+#else
+    if ((right > 0 && left > INT64_MAX - right) || (right < 0 && left < INT64_MIN - right)) {
+        return 1;
+    }
+    *result = left + right;
+    return 0;
+#endif
+}
+
+static inline int sub_overflow(int64_t left, int64_t right, int64_t *result) {
+#if defined(__GNUC__) || defined(__clang__)
+    return __builtin_sub_overflow(left, right, result);
+#else
+    if ((right < 0 && left > INT64_MAX + right) || (right > 0 && left < INT64_MIN + right)) {
+        return 1;
+    }
+    *result = left - right;
+    return 0;
+#endif
+}
+
+static inline int mul_overflow(int64_t left, int64_t right, int64_t *result) {
+#if defined(__GNUC__) || defined(__clang__)
+    return __builtin_mul_overflow(left, right, result);
+#else
+    if (left > 0) {
+        if (right > 0 ? left > INT64_MAX / right : right < INT64_MIN / left) {
+            return 1;
+        }
+    } else if (left < 0) {
+        if (right > 0 ? left < INT64_MIN / right : right < INT64_MAX / left) {
+            return 1;
+        }
+    }
+    *result = left * right;
+    return 0;
+#endif
+}
+
+/* division and remainder rounding towards negative infinity like Python */
+
+static inline int div_floor(int64_t left, int64_t right, int64_t *result) {
+    if (right == 0 || (left == INT64_MIN && right == -1)) {
+        return 1;
+    }
+    int64_t quotient = left / right;
+    if (left % right != 0 && (left < 0) != (right < 0)) {
+        quotient -= 1;
+    }
+    *result = quotient;
+    return 0;
+}
+
+static inline int mod_floor(int64_t left, int64_t right, int64_t *result) {
+    if (right == 0) {
+        return 1;
+    }
+    if (right == -1) {
+        /* avoid the overflow of INT64_MIN % -1 */
+        *result = 0;
+        return 0;
+    }
+    int64_t remainder = left % right;
+    if (remainder != 0 && (remainder < 0) != (right < 0)) {
+        remainder += right;
+    }
+    *result = remainder;
+    return 0;
+}
+
+/* binary instructions by value, returning nonzero if the result is not representable */
+static inline int binary(int operation, int64_t left, int64_t right, int64_t *result) {
+    switch (operation) {
+        case ADD:
+            return add_overflow(left, right, result);
+        case MUL:
+            return mul_overflow(left, right, result);
+        case SUB:
+            return sub_overflow(left, right, result);
+        case DIV:
+            return div_floor(left, right, result);
+        case MOD:
+            return mod_floor(left, right, result);
+        case EQ:
+            *result = left == right;
+            return 0;
+        case NE:
+            *result = left != right;
+            return 0;
+        case LT:
+            *result = left < right;
+            return 0;
+        case GT:
+            *result = left > right;
+            return 0;
+        case LE:
+            *result = left <= right;
+            return 0;
+        case GE:
+            *result = left >= right;
+            return 0;
+        default:
+            return 1;
+    }
+}
+
+/* execute until the program halts (returning 1) or an instruction is not supported (returning 0) */
+static int run(
+    const uint8_t *operations,
+    const int64_t *payloads,
+    Py_ssize_t length,
+    const int64_t *constants,
+    Py_ssize_t constant_count,
+    int64_t *stack,
+    Py_ssize_t capacity,
+    int64_t *memory,
+    int64_t *defined,
+    Py_ssize_t size,
+    const int64_t *inputs,
+    Py_ssize_t input_size,
+    int64_t *outputs,
+    Py_ssize_t output_size,
+    int64_t *registers
+) {
+    Py_ssize_t index = (Py_ssize_t)registers[INDEX];
+    Py_ssize_t top = (Py_ssize_t)registers[TOP];
+    Py_ssize_t output = (Py_ssize_t)registers[OUTPUT];
+    Py_ssize_t position = (Py_ssize_t)registers[INPUT];
+    int64_t count = registers[DEFINED];
+    int halted = 0;
+    int operation;
+    int64_t payload, left, right, result;
+
+#if USE_COMPUTED_GOTO
+#define TARGET(name) target_##name:
+#define DISPATCH() goto *targets[operation]
+    static void *targets[256] = {
+        [0 ... 255] = &&target_stop,
+        [HALT] = &&target_halt,
+        [ADD] = &&target_binary,
+        [MUL] = &&target_binary,
+        [SUB] = &&target_binary,
+        [DIV] = &&target_binary,
+        [MOD] = &&target_binary,
+        [EQ] = &&target_binary,
+        [NE] = &&target_binary,
+        [LT] = &&target_binary,
+        [GT] = &&target_binary,
+        [LE] = &&target_binary,
+        [GE] = &&target_binary,
+        [IMMEDIATE + ADD ... IMMEDIATE + GE] = &&target_immediate,
+        [INCREMENT] = &&target_increment,
+        [LOAD] = &&target_load,
+        [STORE] = &&target_store,
+        [LIT] = &&target_lit,
+        [JMP] = &&target_jmp,
+        [JMC] = &&target_jmc,
+        [WRITE] = &&target_write,
+        [READ] = &&target_read
+    };
+#else
+#define TARGET(name) target_##name:
+#define DISPATCH() goto dispatch
+#endif
+
+/* the operations end with HALT, which makes checking the index necessary only for jumps */
+#define NEXT() \
+    do { \
+        operation = operations[index]; \
+        payload = payloads[index]; \
+        DISPATCH(); \
+    } while (0)
+
+#define JUMP(target) \
+    do { \
+        index = (Py_ssize_t)(target); \
+        if (index < 0 || index >= length) { \
+            goto target_halt; \
+        } \
+        NEXT(); \
+    } while (0)
+
+    JUMP(index);
+
+#if !USE_COMPUTED_GOTO
+dispatch:
+    if (operation >= ADD && operation <= GE) {
+        goto target_binary;
+    }
+    if (operation > IMMEDIATE && operation <= IMMEDIATE + GE) {
+        goto target_immediate;
+    }
+    switch (operation) {
+        case HALT:
+            goto target_halt;
+        case INCREMENT:
+            goto target_increment;
+        case LOAD:
+            goto target_load;
+        case STORE:
+            goto target_store;
+        case LIT:
+            goto target_lit;
+        case JMP:
+            goto target_jmp;
+        case JMC:
+            goto target_jmc;
+        case WRITE:
+            goto target_write;
+        case READ:
+            goto target_read;
+        default:
+            /* invalid instructions are left to the interpreter */
+            goto target_stop;
+    }
+#endif
+
+    TARGET(binary)
+        if (top < 2) {
+            goto target_stop;
+        }
+        if (binary(operation, stack[top - 2], stack[top - 1], &result)) {
+            goto target_stop;
+        }
+        stack[top - 2] = result;
+        top -= 1;
+        index += 1;
+        NEXT();
+
+    TARGET(immediate)
+        /* the literal is the right operand and does not need to be pushed */
+        if (top < 1 || payload < 0 || payload >= constant_count) {
+            goto target_stop;
+        }
+        if (binary(operation - IMMEDIATE, stack[top - 1], constants[payload], &result)) {
+            goto target_stop;
+        }
+        stack[top - 1] = result;
+        index += 2;
+        NEXT();
+
+    TARGET(increment)
+        if (payload < 0 || payload >= size || !defined[payload] || index + 1 >= length) {
+            goto target_stop;
+        }
+        right = payloads[index + 1];
+        if (right < 0 || right >= constant_count) {
+            goto target_stop;
+        }
+        left = memory[payload];
+        right = constants[right];
+        if (add_overflow(left, right, &result)) {
+            goto target_stop;
+        }
+        memory[payload] = result;
+        index += 4;
+        NEXT();
+
+    TARGET(load)
+        if (top == capacity || payload < 0 || payload >= size || !defined[payload]) {
+            goto target_stop;
+        }
+        stack[top] = memory[payload];
+        top += 1;
+        index += 1;
+        NEXT();
+
+    TARGET(store)
+        if (top == 0 || payload < 0 || payload >= size) {
+            goto target_stop;
+        }
+        top -= 1;
+        memory[payload] = stack[top];
+        if (!defined[payload]) {
+            defined[payload] = ++count;
+        }
+        index += 1;
+        NEXT();
+
+    TARGET(lit)
+        if (top == capacity || payload < 0 || payload >= constant_count) {
+            goto target_stop;
+        }
+        stack[top] = constants[payload];
+        top += 1;
+        index += 1;
+        NEXT();
+
+    TARGET(jmp)
+        JUMP(payload);
+
+    TARGET(jmc)
+        if (top == 0) {
+            goto target_stop;
+        }
+        top -= 1;
+        if (stack[top] == 0) {
+            JUMP(payload);
+        }
+        index += 1;
+        NEXT();
+
+    TARGET(write)
+        if (output == output_size || payload < 0 || payload >= size || !defined[payload]) {
+            goto target_stop;
+        }
+        outputs[output] = memory[payload];
+        output += 1;
+        index += 1;
+        NEXT();
+
+    TARGET(read)
+        if (position < 0 || position >= input_size || payload < 0 || payload >= size) {
+            goto target_stop;
+        }
+        memory[payload] = inputs[position];
+        if (!defined[payload]) {
+            defined[payload] = ++count;
+        }
+        position += 1;
+        index += 1;
+        NEXT();
+
+    TARGET(halt)
+        halted = 1;
+
+    TARGET(stop)
+        registers[INDEX] = index;
+        registers[TOP] = top;
+        registers[OUTPUT] = output;
+        registers[INPUT] = position;
+        registers[DEFINED] = count;
+        return halted;
+
+#undef JUMP
+#undef NEXT
+#undef DISPATCH
+#undef TARGET
+}
+
+/* acquire a contiguous buffer of items with a specific size */
+static int get_buffer(PyObject *object, Py_buffer *view, Py_ssize_t itemsize, int writable, const char *name) {
+    if (PyObject_GetBuffer(object, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | (writable ? PyBUF_WRITABLE : 0)) < 0) {
+        return -1;
+    }
+    if (view->itemsize != itemsize) {
+        PyErr_Format(PyExc_TypeError, "%s must have items of %zd bytes", name, itemsize);
+        PyBuffer_Release(view);
+        return -1;
+    }
+    return 0;
+}
+
+#define BUFFER_COUNT 9
+
+static const char *BUFFER_NAMES[BUFFER_COUNT] = {
+    "operations",
+    "payloads",
+    "constants",
+    "stack",
+    "memory",
+    "defined",
+    "inputs",
+    "outputs",
+    "registers"
+};
+
+static const Py_ssize_t BUFFER_ITEMSIZES[BUFFER_COUNT] = {1, 8, 8, 8, 8, 8, 8, 8, 8};
+
+static const int BUFFER_WRITABLE[BUFFER_COUNT] = {0, 0, 0, 1, 1, 1, 0, 1, 1};
+
+static PyObject *execute(PyObject *module, PyObject *const *args, Py_ssize_t nargs) {
+    Py_buffer views[BUFFER_COUNT];
+    Py_ssize_t acquired;
+    int halted;
+
+    if (nargs != BUFFER_COUNT) {
+        PyErr_Format(PyExc_TypeError, "execute() takes exactly %d arguments (%zd given)", BUFFER_COUNT, nargs);
+        return NULL;
+    }
+    for (acquired = 0; acquired < BUFFER_COUNT; acquired++) {
+        if (get_buffer(args[acquired], &views[acquired], BUFFER_ITEMSIZES[acquired], BUFFER_WRITABLE[acquired], BUFFER_NAMES[acquired]) < 0) {
+            goto error;
+        }
+    }
+    if (views[1].len < views[0].len * 8 || views[5].len < views[4].len || views[8].len < 5 * 8) {
+        PyErr_SetString(PyExc_ValueError, "buffer sizes do not match");
+        goto error;
+    }
+    if (views[0].len == 0 || ((const uint8_t *)views[0].buf)[views[0].len - 1] != HALT) {
+        PyErr_SetString(PyExc_ValueError, "operations do not end with HALT");
+        goto error;
+    }
+    halted = run(
+        (const uint8_t *)views[0].buf,
+        (const int64_t *)views[1].buf,
+        views[0].len,
+        (const int64_t *)views[2].buf,
+        views[2].len / 8,
+        (int64_t *)views[3].buf,
+        views[3].len / 8,
+        (int64_t *)views[4].buf,
+        (int64_t *)views[5].buf,
+        views[4].len / 8,
+        (const int64_t *)views[6].buf,
+        views[6].len / 8,
+        (int64_t *)views[7].buf,
+        views[7].len / 8,
+        (int64_t *)views[8].buf
+    );
+    for (Py_ssize_t i = 0; i < BUFFER_COUNT; i++) {
+        PyBuffer_Release(&views[i]);
+    }
+    return PyBool_FromLong(halted);
+
+error:
+    while (acquired > 0) {
+        PyBuffer_Release(&views[--acquired]);
+    }
+    return NULL;
+}
+
+static PyMethodDef METHODS[] = {
+    {
+        "execute",
+        (PyCFunction)(void (*)(void))execute,
+        METH_FASTCALL,
+        "execute(operations, payloads, constants, stack, memory, defined, inputs, outputs, registers)\n--\n\n"
+        "Execute a program on 64 bit integer buffers, see AMN.am0._execute."
+    },
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef MODULE = {
+    PyModuleDef_HEAD_INIT,
+    "AMN._am0",
+    "Native execution of AM0 programs",
+    0,
+    METHODS
+};
+
+PyMODINIT_FUNC PyInit__am0(void) {
+    return PyModule_Create(&MODULE);
+}
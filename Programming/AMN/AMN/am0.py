@@ -3,13 +3,19 @@
 """Simple virtual machine for the AM0 instruction set"""
 
 from __future__ import annotations
-from collections.abc import Iterator, Iterable, Mapping
+from array import array
+from collections.abc import Callable, Iterator, Iterable, Sequence, MutableSequence, Mapping
 from enum import Enum, unique
-from . import AbstractEnumMeta, AbstractInstruction, AbstractMachine
+from functools import cache, partial
+import operator
+from types import CodeType
+from typing import ClassVar, Any, cast, overload
+from . import AbstractEnumMeta, AbstractInstruction, AbstractMachine, InputBuffer
 
 
 __all__ = (
     "Instruction",
+    "Program",
     "Machine"
 )
 
@@ -40,19 +46,539 @@ class Instruction(AbstractInstruction[tuple["Instruction", int]], Enum, metaclas
     @classmethod
     def parse(cls, line: str) -> tuple[Instruction, int]:
         """parse an instance from a line like '<Name> <payload>' or '<Name>'"""
-        name, seperator, payload = line.partition(" ")
-        if seperator == "":
-            return (cls[name], 0)
+        parts = line.split(" ", 1)
+        if len(parts) == 1:
+            return (_NAMES[line], 0)
         else:
-            return (cls[name], int(payload))
+            return (_NAMES[parts[0]], int(parts[1]))
+
+    @classmethod
+    def compile_program(cls, source: str) -> Program:
+        """parse a program and decode it into a Program"""
+        return Program.from_instructions(cls.parse_program(source))
 
     def is_jump(self) -> bool:
         """check if the instruction is a jump"""
-        return 14 < self.value < 17
+        return (1 << self.value) & _JUMP_MASK != 0
 
     def has_payload(self) -> bool:
         """check if the instruction uses its payload"""
-        return self.value > 11
+        return (1 << self.value) & _PAYLOAD_MASK != 0
+
+
+# instructions by name, faster than looking them up using the enum
+_NAMES = {instruction.name: instruction for instruction in Instruction}
+
+# bit masks of instruction values used by Instruction.is_jump and Instruction.has_payload
+_JUMP_MASK = (1 << Instruction.JMP.value) | (1 << Instruction.JMC.value)
+_PAYLOAD_MASK = 0
+for _instruction in (
+    Instruction.LOAD,
+    Instruction.STORE,
+    Instruction.LIT,
+    Instruction.JMP,
+    Instruction.JMC,
+    Instruction.WRITE,
+    Instruction.READ
+):
+    _PAYLOAD_MASK |= 1 << _instruction.value
+del _instruction
+
+
+class Program(Sequence[tuple[Instruction, int]]):
+    """
+    AM0 program stored as parallel arrays of instruction values and payloads,
+    with the payloads of jumps being the index of their target and the payloads
+    of literals being the index of their value in a pool of constants.
+    The arrays end with an internal HALT instruction which is not part of the sequence.
+    """
+
+    __slots__ = ("operations", "payloads", "constants")
+
+    operations: array[int]
+
+    payloads: array[int] | list[int]
+
+    constants: list[int]
+
+    def __init__(self, operations: array[int], payloads: array[int] | list[int], constants: list[int]) -> None:
+        self.operations = operations
+        self.payloads = payloads
+        self.constants = constants
+
+    @classmethod
+    def from_instructions(cls, instructions: Iterable[tuple[Instruction, int]]) -> Program:
+        """decode instructions into a program"""
+        operations = array("B")
+        values: list[int] = []
+        # every literal is stored once to allow pushing it without creating a new integer
+        pool: dict[int, int] = {}
+        for operation, payload in instructions:
+            operations.append(operation.value)
+            if operation is Instruction.LIT:
+                values.append(pool.setdefault(payload, len(pool)))
+            else:
+                # store jump targets as indices to save adjusting them at runtime
+                values.append(payload - 1 if operation.is_jump() else payload)
+        payloads: array[int] | list[int]
+        try:
+            payloads = array("q", values)
+        except OverflowError:
+            # AM0 integers are unbounded, keep payloads which do not fit as Python integers
+            payloads = values
+        # halt when the last instruction is done without checking the index every step
+        operations.append(_HALT)
+        payloads.append(0)
+        return cls(operations, payloads, list(pool))
+
+    def __len__(self) -> int:
+        return len(self.operations) - 1
+
+    @overload
+    def __getitem__(self, index: int) -> tuple[Instruction, int]:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Program:
+        ...
+
+    def __getitem__(self, index: int | slice) -> tuple[Instruction, int] | Program:
+        length = len(self)
+        if isinstance(index, slice):
+            operations = self.operations[:length][index]
+            payloads = self.payloads[:length][index]
+            operations.append(_HALT)
+            payloads.append(0)
+            return Program(operations, payloads, self.constants)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("program index out of range")
+        instruction = Instruction(self.operations[index])
+        payload = self.payloads[index]
+        if instruction is Instruction.LIT:
+            return (instruction, self.constants[payload])
+        return (instruction, payload + 1 if instruction.is_jump() else payload)
+
+    def memory_size(self) -> int:
+        """return the number of memory cells needed to hold every address used by the program"""
+        addresses = [
+            payload for operation, payload in zip(self.operations, self.payloads)
+            if operation in _MEMORY_OPERATIONS
+        ]
+        return max(addresses, default=-1) + 1
+
+    def compile_to_python(self) -> CodeType:
+        """
+        Compile the program into Python code which defines a function
+        execute(machine, output, index) executing the program starting at a jump target
+        or the first instruction one basic block at a time, returning the final counter.
+        The code also defines COUNTERS, mapping its line numbers to instruction counters.
+        """
+        return compile(_python_source(self), _PYTHON_FILENAME, "exec")
+
+
+_MEMORY_OPERATIONS = frozenset(
+    instruction.value for instruction in (
+        Instruction.LOAD,
+        Instruction.STORE,
+        Instruction.WRITE,
+        Instruction.READ
+    )
+)
+
+
+def _arithmetic(operation: Callable[[int, int], int], machine: Machine, _: int, index: int) -> int:
+    """replace the two topmost stack values with the result of an arithmetic operation"""
+    stack = machine.stack
+    stack[-2] = operation(stack[-2], stack[-1])
+    stack.pop()
+    return index + 1
+
+
+def _comparison(operation: Callable[[int, int], bool], machine: Machine, _: int, index: int) -> int:
+    """replace the two topmost stack values with the result of a comparison as 1 or 0"""
+    stack = machine.stack
+    stack[-2] = int(operation(stack[-2], stack[-1]))
+    stack.pop()
+    return index + 1
+
+
+# instruction values as plain integers for the native execution
+_ADD = Instruction.ADD.value
+_MUL = Instruction.MUL.value
+_SUB = Instruction.SUB.value
+_DIV = Instruction.DIV.value
+_MOD = Instruction.MOD.value
+_EQ = Instruction.EQ.value
+_NE = Instruction.NE.value
+_LT = Instruction.LT.value
+_GT = Instruction.GT.value
+_LE = Instruction.LE.value
+_GE = Instruction.GE.value
+_LOAD = Instruction.LOAD.value
+_STORE = Instruction.STORE.value
+_LIT = Instruction.LIT.value
+_JMP = Instruction.JMP.value
+_JMC = Instruction.JMC.value
+_WRITE = Instruction.WRITE.value
+_READ = Instruction.READ.value
+
+# internal instruction ending every Program
+_HALT = 0
+
+# superinstructions used by the native execution and the Python code, they replace
+# the first instruction of a sequence whose remaining instructions are skipped
+_IMMEDIATE = 32     # LIT n followed by a binary instruction, added to its value
+_INCREMENT = 64     # LOAD k, LIT n, ADD, STORE k
+
+# indices into the registers of the native execution
+_INDEX = 0
+_TOP = 1
+_OUTPUT = 2
+_INPUT = 3
+_DEFINED = 4
+
+# default capacities of the native stack and output buffers
+NATIVE_STACK_SIZE = 1024
+NATIVE_OUTPUT_SIZE = 1024
+
+# maximum number of memory cells used by the native execution
+NATIVE_MEMORY_SIZE = 1 << 16
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+def _execute(
+    operations: Sequence[int],
+    payloads: Sequence[int],
+    constants: Sequence[int],
+    stack: MutableSequence[int],
+    memory: MutableSequence[int],
+    defined: MutableSequence[int],
+    inputs: Sequence[int],
+    outputs: MutableSequence[int],
+    registers: MutableSequence[int]
+) -> bool:
+    """
+    Execute a program on fixed size 64 bit integer buffers with an explicit top of stack
+    and memory indexed by address, with defined holding the order in which addresses were
+    first assigned a value (starting at 1) or 0 for addresses which hold no value.
+    The payloads of literals are indices into constants and the operations have to end with HALT.
+    Values are read from inputs starting at the input register.
+    Execution stops before the first instruction which can not be executed using the
+    buffers, for example because of an overflow or an unknown memory address.
+    The registers are updated in any case and True is returned if the program halted.
+    """
+    index = registers[_INDEX]
+    top = registers[_TOP]
+    output = registers[_OUTPUT]
+    position = registers[_INPUT]
+    count = registers[_DEFINED]
+    length = len(operations)
+    if index < 0 or index >= length:
+        return True
+    halted = False
+    result = 0
+    # HALT makes checking the index necessary only for jumps
+    while True:
+        operation = operations[index]
+        payload = payloads[index]
+        if _ADD <= operation <= _GE or _IMMEDIATE < operation <= _IMMEDIATE + _GE:
+            if operation > _IMMEDIATE:
+                # the literal is the right operand and does not need to be pushed
+                if top < 1:
+                    break
+                binary = operation - _IMMEDIATE
+                left = stack[top - 1]
+                right = constants[payload]
+                consumed = 0
+                step = 2
+            else:
+                if top < 2:
+                    break
+                binary = operation
+                left = stack[top - 2]
+                right = stack[top - 1]
+                consumed = 1
+                step = 1
+            if binary == _ADD:
+                result = left + right
+                # the range check works without and the sign check with wrapping arithmetic
+                if result < _INT64_MIN or result > _INT64_MAX or ((left ^ result) & (right ^ result)) < 0:
+                    break
+            elif binary == _MUL:
+                # the range of right is checked before multiplying since the product wraps when compiled
+                if left > 0:
+                    if right < (_INT64_MIN + left - 1) // left or right > _INT64_MAX // left:
+                        break
+                elif left < 0:
+                    if right < -((_INT64_MIN + 1) // left) or (left != -1 and right > _INT64_MIN // left):
+                        break
+                result = left * right
+            elif binary == _SUB:
+                result = left - right
+                if result < _INT64_MIN or result > _INT64_MAX or ((left ^ right) & (left ^ result)) < 0:
+                    break
+            elif binary == _DIV:
+                if right == 0 or (left == _INT64_MIN and right == -1):
+                    break
+                result = left // right
+            elif binary == _MOD:
+                if right == 0:
+                    break
+                result = left % right
+            elif binary == _EQ:
+                result = 1 if left == right else 0
+            elif binary == _NE:
+                result = 1 if left != right else 0
+            elif binary == _LT:
+                result = 1 if left < right else 0
+            elif binary == _GT:
+                result = 1 if left > right else 0
+            elif binary == _LE:
+                result = 1 if left <= right else 0
+            elif binary == _GE:
+                result = 1 if left >= right else 0
+            else:
+                break
+            stack[top - 1 - consumed] = result
+            top -= consumed
+            index += step
+            continue
+        elif operation == _INCREMENT:
+            if payload < 0 or payload >= len(memory) or not defined[payload]:
+                break
+            left = memory[payload]
+            right = constants[payloads[index + 1]]
+            result = left + right
+            if result < _INT64_MIN or result > _INT64_MAX or ((left ^ result) & (right ^ result)) < 0:
+                break
+            memory[payload] = result
+            index += 4
+            continue
+        elif operation == _LOAD:
+            if top == len(stack) or payload < 0 or payload >= len(memory) or not defined[payload]:
+                break
+            stack[top] = memory[payload]
+            top += 1
+        elif operation == _STORE:
+            if top == 0 or payload < 0 or payload >= len(memory):
+                break
+            top -= 1
+            memory[payload] = stack[top]
+            if not defined[payload]:
+                count += 1
+                defined[payload] = count
+        elif operation == _LIT:
+            if top == len(stack):
+                break
+            stack[top] = constants[payload]
+            top += 1
+        elif operation == _JMP:
+            index = payload
+            if index < 0 or index >= length:
+                halted = True
+                break
+            continue
+        elif operation == _JMC:
+            if top == 0:
+                break
+            top -= 1
+            if stack[top] == 0:
+                index = payload
+                if index < 0 or index >= length:
+                    halted = True
+                    break
+                continue
+        elif operation == _WRITE:
+            if output == len(outputs) or payload < 0 or payload >= len(memory) or not defined[payload]:
+                break
+            outputs[output] = memory[payload]
+            output += 1
+        elif operation == _READ:
+            if position < 0 or position >= len(inputs) or payload < 0 or payload >= len(memory):
+                break
+            memory[payload] = inputs[position]
+            if not defined[payload]:
+                count += 1
+                defined[payload] = count
+            position += 1
+        elif operation == _HALT:
+            halted = True
+            break
+        else:
+            # invalid instructions are left to the interpreter
+            break
+        index += 1
+    registers[_INDEX] = index
+    registers[_TOP] = top
+    registers[_OUTPUT] = output
+    registers[_INPUT] = position
+    registers[_DEFINED] = count
+    return halted
+
+
+# file name of code created by Program.compile_to_python
+_PYTHON_FILENAME = "<AM0 program>"
+
+# operators used by the Python code of binary instructions
+_PYTHON_ARITHMETIC = {
+    _ADD: "+",
+    _MUL: "*",
+    _SUB: "-",
+    _DIV: "//",
+    _MOD: "%"
+}
+_PYTHON_COMPARISON = {
+    _EQ: "==",
+    _NE: "!=",
+    _LT: "<",
+    _GT: ">",
+    _LE: "<=",
+    _GE: ">="
+}
+
+
+def _python_source(program: Program) -> str:
+    """generate the source code used by Program.compile_to_python"""
+    length = len(program)
+    # basic blocks start at the beginning, at jump targets and after jumps
+    leaders = {0}
+    for index, (operation, payload) in enumerate(zip(program.operations, program.payloads)):
+        if operation == _JMP or operation == _JMC:
+            leaders.add(payload)
+            leaders.add(index + 1)
+    lines: list[str] = []
+    # counter of the instruction on every line, 0 for lines without one
+    counters = [0]
+    blocks: list[int] = []
+
+    def instruction(line: str, index: int) -> None:
+        lines.append(f"    {line}")
+        counters.append(index + 1)
+
+    operations = _fuse(program)
+    payloads = program.payloads
+    constants = program.constants
+    index = 0
+    while index < length:
+        operation = operations[index]
+        payload = payloads[index]
+        if index in leaders:
+            lines.append(f"def block_{index}(stack, memory, input, output):")
+            counters.append(0)
+            blocks.append(index)
+        step = 1
+        if operation in _PYTHON_ARITHMETIC:
+            instruction(f"stack[-2] = stack[-2] {_PYTHON_ARITHMETIC[operation]} stack[-1]; stack.pop()", index)
+        elif operation in _PYTHON_COMPARISON:
+            instruction(f"stack[-2] = 1 if stack[-2] {_PYTHON_COMPARISON[operation]} stack[-1] else 0; stack.pop()", index)
+        elif operation - _IMMEDIATE in _PYTHON_ARITHMETIC:
+            instruction(f"stack[-1] = stack[-1] {_PYTHON_ARITHMETIC[operation - _IMMEDIATE]} {constants[payload]}", index)
+            step = 2
+        elif operation - _IMMEDIATE in _PYTHON_COMPARISON:
+            instruction(f"stack[-1] = 1 if stack[-1] {_PYTHON_COMPARISON[operation - _IMMEDIATE]} {constants[payload]} else 0", index)
+            step = 2
+        elif operation == _INCREMENT:
+            instruction(f"memory[{payload}] = memory[{payload}] + {constants[payloads[index + 1]]}", index)
+            step = 4
+        elif operation == _LOAD:
+            instruction(f"stack.append(memory[{payload}])", index)
+        elif operation == _STORE:
+            instruction(f"memory[{payload}] = stack.pop()", index)
+        elif operation == _LIT:
+            instruction(f"stack.append({constants[payload]})", index)
+        elif operation == _JMP:
+            instruction(f"return {payload}", index)
+            index += 1
+            continue
+        elif operation == _JMC:
+            instruction(f"return {payload} if stack.pop() == 0 else {index + 1}", index)
+            index += 1
+            continue
+        elif operation == _WRITE:
+            instruction(f"output.append(memory[{payload}])", index)
+        elif operation == _READ:
+            instruction(f"memory[{payload}] = next(input)", index)
+        else:
+            instruction("raise ValueError('invalid instruction')", index)
+        index += step
+        if index in leaders or index == length:
+            lines.append(f"    return {index}")
+            counters.append(0)
+    lines.extend((
+        f"BLOCKS = {{{', '.join(f'{index}: block_{index}' for index in blocks)}}}",
+        f"COUNTERS = {tuple(counters)!r}",
+        "def execute(machine, output, index):",
+        "    stack = machine.stack",
+        "    memory = machine.memory",
+        "    input = machine.input",
+        "    block = index",
+        "    while True:",
+        "        function = BLOCKS.get(block)",
+        # every jump target inside the program starts a block, so the block is outside
+        "        if function is None:",
+        "            return block + 1",
+        "        block = function(stack, memory, input, output)",
+        ""
+    ))
+    return "\n".join(lines)
+
+
+def _fuse(program: Program) -> array[int]:
+    """return the instruction values of a program with sequences replaced by superinstructions"""
+    operations = array("B", program.operations)
+    payloads = program.payloads
+    length = len(operations)
+    # instructions inside of sequences can not be fused if they are jumped to
+    targets = {
+        payload for operation, payload in zip(operations, payloads)
+        if operation == _JMP or operation == _JMC
+    }
+    index = 0
+    while index < length - 1:
+        operation = operations[index]
+        if (
+            operation == _LOAD
+            and index + 3 < length
+            and operations[index + 1] == _LIT
+            and operations[index + 2] == _ADD
+            and operations[index + 3] == _STORE
+            and payloads[index + 3] == payloads[index]
+            and targets.isdisjoint(range(index + 1, index + 4))
+        ):
+            operations[index] = _INCREMENT
+            index += 4
+        elif operation == _LIT and _ADD <= operations[index + 1] <= _GE and index + 1 not in targets:
+            operations[index] = _IMMEDIATE + operations[index + 1]
+            index += 2
+        else:
+            index += 1
+    return operations
+
+
+@cache
+def _native_execute() -> Callable[..., bool] | None:
+    """return _execute implemented by the C extension or compiled by Numba, or None if both are not available"""
+    try:
+        from ._am0 import execute   # type: ignore
+    except ImportError:
+        pass
+    else:
+        return cast(Callable[..., bool], execute)
+    try:
+        import numba    # type: ignore
+    except ImportError:
+        return None
+    return cast(Callable[..., bool], numba.njit(cache=True)(_execute))
+
+
+class _Halt(Exception):
+    """raised when a program reaches its HALT instruction"""
+
+    __slots__ = ()
 
 
 class Machine(AbstractMachine[tuple[Instruction, int]]):
@@ -97,63 +623,265 @@ class Machine(AbstractMachine[tuple[Instruction, int]]):
             f"{' : '.join(map(str, output)):ε<1})"
         )
 
+    def _halt(self, _: int, index: int) -> int:
+        """stop the execution of a program"""
+        raise _Halt()
+
+    def _load(self, address: int, index: int) -> int:
+        """push a value from memory"""
+        self.stack.append(self.memory[address])
+        return index + 1
+
+    def _store(self, address: int, index: int) -> int:
+        """pop a value into memory"""
+        self.memory[address] = self.stack.pop()
+        return index + 1
+
+    def _lit(self, literal: int, index: int) -> int:
+        """push a literal"""
+        self.stack.append(literal)
+        return index + 1
+
+    def _jmp(self, target: int, _: int) -> int:
+        """jump unconditionally"""
+        return target
+
+    def _jmc(self, target: int, index: int) -> int:
+        """jump if the topmost stack value is zero"""
+        return target if self.stack.pop() == 0 else index + 1
+
+    def _write(self, _: int, index: int) -> int:
+        """output a value from memory, which is looked up by the caller"""
+        return index + 1
+
+    def _read(self, address: int, index: int) -> int:
+        """read a value into memory"""
+        self.memory[address] = next(self.input)
+        return index + 1
+
+    # handlers indexed by the value of their instruction, returning the next index
+    _HANDLERS: ClassVar[tuple[Callable[[Machine, int, int], int], ...]] = (
+        _halt,
+        partial(_arithmetic, operator.add),
+        partial(_arithmetic, operator.mul),
+        partial(_arithmetic, operator.sub),
+        partial(_arithmetic, operator.floordiv),
+        partial(_arithmetic, operator.mod),
+        partial(_comparison, operator.eq),
+        partial(_comparison, operator.ne),
+        partial(_comparison, operator.lt),
+        partial(_comparison, operator.gt),
+        partial(_comparison, operator.le),
+        partial(_comparison, operator.ge),
+        _load,
+        _store,
+        _lit,
+        _jmp,
+        _jmc,
+        _write,
+        _read
+    )
+
     def execute_instruction(self, instruction: tuple[Instruction, int]) -> int | None:
         """execute an instruction, returning the output if produced"""
-        value = None
-        match instruction:
-            case (Instruction.ADD, _):
-                self.stack[-2] = self.stack[-2] + self.stack[-1]
-                self.stack.pop()
-            case (Instruction.MUL, _):
-                self.stack[-2] = self.stack[-2] * self.stack[-1]
-                self.stack.pop()
-            case (Instruction.SUB, _):
-                self.stack[-2] = self.stack[-2] - self.stack[-1]
-                self.stack.pop()
-            case (Instruction.DIV, _):
-                self.stack[-2] = self.stack[-2] // self.stack[-1]
-                self.stack.pop()
-            case (Instruction.MOD, _):
-                self.stack[-2] = self.stack[-2] % self.stack[-1]
-                self.stack.pop()
-            case (Instruction.EQ, _):
-                self.stack[-2] = self.stack[-2] == self.stack[-1]
-                self.stack.pop()
-            case (Instruction.NE, _):
-                self.stack[-2] = self.stack[-2] != self.stack[-1]
-                self.stack.pop()
-            case (Instruction.LT, _):
-                self.stack[-2] = self.stack[-2] < self.stack[-1]
-                self.stack.pop()
-            case (Instruction.GT, _):
-                self.stack[-2] = self.stack[-2] > self.stack[-1]
-                self.stack.pop()
-            case (Instruction.LE, _):
-                self.stack[-2] = self.stack[-2] <= self.stack[-1]
-                self.stack.pop()
-            case (Instruction.GE, _):
-                self.stack[-2] = self.stack[-2] >= self.stack[-1]
-                self.stack.pop()
-            case (Instruction.LOAD, address):
-                self.stack.append(self.memory[address])
-            case (Instruction.STORE, address):
-                self.memory[address] = self.stack.pop()
-            case (Instruction.LIT, literal):
-                self.stack.append(literal)
-            case (Instruction.JMP, counter):
-                self.counter = counter - 1
-            case (Instruction.JMC, counter):
-                if self.stack.pop() == 0:
-                    self.counter = counter - 1
-            case (Instruction.WRITE, address):
-                value = self.memory[address]
-            case (Instruction.READ, address):
-                self.memory[address] = next(self.input)
-            case invalid:
-                raise ValueError(f"invalid instruction: '{invalid}'")
-        self.counter += 1
+        operation, payload = instruction
+        if not isinstance(operation, Instruction):
+            raise ValueError(f"invalid instruction: '{instruction}'")
+        if operation.is_jump():
+            payload -= 1
+        index = self._HANDLERS[operation.value](self, payload, self.counter - 1)
+        value = self.memory[payload] if operation is Instruction.WRITE else None
+        self.counter = index + 1
         return value
 
+    def execute_program(self, program: Sequence[tuple[Instruction, int]]) -> Iterator[int | None]:
+        """execute a program, yielding after every instruction"""
+        if not isinstance(program, Program):
+            program = Program.from_instructions(program)
+        self.counter = 1
+        yield from self._continue_program(program)
+
+    def _continue_program(self, program: Program) -> Iterator[int | None]:
+        """continue executing a program at the current counter, yielding after every instruction"""
+        # keep everything needed for dispatching in locals
+        handlers = self._HANDLERS
+        operations = program.operations
+        payloads = program.payloads
+        constants = program.constants
+        stack = self.stack
+        memory = self.memory
+        load = _LOAD
+        lit = _LIT
+        write = _WRITE
+        jmp = _JMP
+        jmc = _JMC
+        length = len(program)
+        index = self.counter - 1
+        if not 0 <= index < length:
+            return
+        try:
+            # the program ends with HALT, which makes checking the index necessary only for jumps
+            while True:
+                operation = operations[index]
+                # the most common instructions work on the locals directly
+                if operation == load:
+                    stack.append(memory[payloads[index]])
+                    index += 1
+                elif operation == lit:
+                    stack.append(constants[payloads[index]])
+                    index += 1
+                elif operation == write:
+                    # the only instruction with an output
+                    value = memory[payloads[index]]
+                    index += 1
+                    self.counter = index + 1
+                    yield value
+                    continue
+                # the condition of JMC is popped only once
+                elif operation == jmp or (operation == jmc and stack.pop() == 0):
+                    index = payloads[index]
+                    if not 0 <= index < length:
+                        # jumping outside of the program halts it
+                        self.counter = index + 1
+                        yield None
+                        return
+                elif operation == jmc:
+                    index += 1
+                else:
+                    index = handlers[operation](self, payloads[index], index)
+                self.counter = index + 1
+                yield None
+        except _Halt:
+            return
+
+    def _run_program(self, program: Program, output: list[int]) -> None:
+        """continue executing a program at the current counter until it halts, appending the produced values to output"""
+        # same as _continue_program without suspending after every instruction
+        handlers = self._HANDLERS
+        operations = program.operations
+        payloads = program.payloads
+        constants = program.constants
+        stack = self.stack
+        memory = self.memory
+        load = _LOAD
+        lit = _LIT
+        write = _WRITE
+        jmp = _JMP
+        jmc = _JMC
+        length = len(program)
+        index = self.counter - 1
+        if not 0 <= index < length:
+            return
+        try:
+            while True:
+                operation = operations[index]
+                if operation == load:
+                    stack.append(memory[payloads[index]])
+                    index += 1
+                elif operation == lit:
+                    stack.append(constants[payloads[index]])
+                    index += 1
+                elif operation == write:
+                    output.append(memory[payloads[index]])
+                    index += 1
+                elif operation == jmp or (operation == jmc and stack.pop() == 0):
+                    index = payloads[index]
+                    if not 0 <= index < length:
+                        break
+                elif operation == jmc:
+                    index += 1
+                else:
+                    index = handlers[operation](self, payloads[index], index)
+        except _Halt:
+            pass
+        finally:
+            # failing instructions do not advance the index
+            self.counter = index + 1
+
+    def run_batch(self, program: Sequence[tuple[Instruction, int]], output: list[int]) -> None:
+        """execute a program until it halts, appending the produced values to output"""
+        if not isinstance(program, Program):
+            program = Program.from_instructions(program)
+        self.counter = 1
+        execute = _native_execute()
+        if execute is None:
+            self._execute_compiled(program, output)
+        else:
+            while self._execute_native(execute, program, output):
+                index = self.counter - 1
+                if not 0 <= index < len(program) or program.operations[index] != _READ:
+                    break
+                # input which is not buffered is handled by the interpreter, after which the native execution can resume
+                self.execute_instruction(program[index])
+            # continue with the interpreter where the native execution stopped
+            self._run_program(program, output)
+
+    def _execute_compiled(self, program: Program, output: list[int]) -> None:
+        """execute a program at the current counter by compiling it to Python code"""
+        namespace: dict[str, Any] = {}
+        exec(program.compile_to_python(), namespace)
+        try:
+            self.counter = namespace["execute"](self, output, self.counter - 1)
+        except Exception as error:
+            # instructions fail before modifying the machine, which allows the
+            # interpreter to repeat the failing one (or sequence) for the exact error
+            counters = namespace["COUNTERS"]
+            traceback = error.__traceback__
+            while traceback is not None:
+                if traceback.tb_frame.f_code.co_filename == _PYTHON_FILENAME:
+                    line = traceback.tb_lineno
+                    if line < len(counters) and counters[line] > 0:
+                        self.counter = counters[line]
+                traceback = traceback.tb_next
+            if program.operations[self.counter - 1] == _READ:
+                # except for READ, which already consumed the input
+                raise
+            self._run_program(program, output)
+
+    def _execute_native(self, execute: Callable[..., bool], program: Program, output: list[int]) -> bool:
+        """execute a program at the current counter on 64 bit integer buffers until it stops, returning False if not possible"""
+        if not isinstance(program.payloads, array) or min(self.memory, default=0) < 0:
+            # payloads outside int64 and negative addresses are left to the interpreter
+            return False
+        size = max(program.memory_size(), max(self.memory, default=-1) + 1)
+        if size > NATIVE_MEMORY_SIZE:
+            # so are addresses which would require huge buffers
+            return False
+        memory = array("q", bytes(8 * size))
+        defined = array("q", bytes(8 * size))
+        try:
+            constants = array("q", program.constants)
+            stack = array("q", self.stack)
+            for order, (address, value) in enumerate(self.memory.items(), 1):
+                memory[address] = value
+                defined[address] = order
+        except OverflowError:
+            # values which do not fit are left to the interpreter
+            return False
+        top = len(stack)
+        stack.frombytes(bytes(8 * NATIVE_STACK_SIZE))
+        outputs = array("q", bytes(8 * NATIVE_OUTPUT_SIZE))
+        # buffered input can be read directly
+        buffer = self.input if isinstance(self.input, InputBuffer) and isinstance(self.input.values, array) else None
+        inputs = array("q") if buffer is None else buffer.values
+        position = 0 if buffer is None else buffer.position
+        registers = array("q", [self.counter - 1, top, 0, position, len(self.memory)])
+        operations = _fuse(program)
+        while True:
+            halted = execute(operations, program.payloads, constants, stack, memory, defined, inputs, outputs, registers)
+            output.extend(outputs[:registers[_OUTPUT]])
+            if halted or registers[_OUTPUT] < len(outputs):
+                break
+            registers[_OUTPUT] = 0
+        if buffer is not None:
+            buffer.position = registers[_INPUT]
+        self.counter = registers[_INDEX] + 1
+        self.stack[:] = stack[:registers[_TOP]]
+        # addresses are updated in the order they were defined to keep the order of the dict
+        addresses = sorted((address for address in range(size) if defined[address]), key=defined.__getitem__)
+        self.memory.update((address, memory[address]) for address in addresses)
+        return True
+
     def reset(self) -> None:
         """reset the machine to the default state"""
         self.counter = 1
@@ -91,11 +91,11 @@ class Instruction(AbstractInstruction[tuple["Instruction", MemoryContext, int]],
 
     def is_jump(self) -> bool:
         """check if the instruction is a jump"""
-        return self.value in {18, 19, 25, 27}
+        return (1 << self.value) & _JUMP_MASK != 0
 
     def has_payload(self) -> bool:
         """check if the instruction uses its payload"""
-        return self.value > 11 and self is not Instruction.PUSH
+        return (1 << self.value) & _PAYLOAD_MASK != 0
 
     def has_context(self) -> bool:
         """check if the instruction has a context"""
@@ -108,6 +108,17 @@ class Instruction(AbstractInstruction[tuple["Instruction", MemoryContext, int]],
         )
 
 
+# bit masks of instruction values used by Instruction.is_jump and Instruction.has_payload
+_JUMP_MASK = 0
+for _instruction in (Instruction.JMP, Instruction.JMC, Instruction.CALL, Instruction.RET):
+    _JUMP_MASK |= 1 << _instruction.value
+_PAYLOAD_MASK = 0
+for _instruction in Instruction:
+    if _instruction.value > 11 and _instruction is not Instruction.PUSH:
+        _PAYLOAD_MASK |= 1 << _instruction.value
+del _instruction
+
+
 class Machine(AbstractMachine[tuple[Instruction, MemoryContext, int]]):
     """machine for executing AM0 instructions"""
 
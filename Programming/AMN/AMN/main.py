@@ -5,8 +5,8 @@
 import sys
 from typing import Type, TypeVar, Any, cast
 from argparse import ArgumentParser, FileType, Namespace
-from itertools import repeat
-from . import __doc__, __version__, AbstractInstruction, AbstractMachine
+from itertools import chain, repeat
+from . import __doc__, __version__, AbstractInstruction, AbstractMachine, InputBuffer
 from .am0 import Instruction as AM0Instruction, Machine as AM0Machine
 from .am1 import Instruction as AM1Instruction, Machine as AM1Machine
 from .repl import REPL
@@ -19,6 +19,9 @@ __all__ = (
 
 T = TypeVar("T")
 
+# number of states written at once by the trace subcommand
+TRACE_BUFFER_SIZE = 1024
+
 MACHINES: dict[str, tuple[Type[AbstractInstruction[Any]], Type[AbstractMachine[Any]]]] = {
     "AM0": (AM0Instruction, AM0Machine),
     "AM1": (AM1Instruction, AM1Machine)
@@ -41,12 +44,25 @@ def main_repl(instruction: Type[AbstractInstruction[T]], machine: Type[AbstractM
 
 def main_exec(instruction: Type[AbstractInstruction[T]], machine: Type[AbstractMachine[T]], args: Namespace) -> int:
     """entry point for the exec subcommand"""
-    program = tuple(instruction.parse_program(args.file.read()))
-    _machine = machine.default(map(int, map(input, repeat("Input: "))))
-    for value in _machine.execute_program(program):
-        if value is not None:
-            print(f"Output: {value}")
+    program = instruction.compile_program(args.file.read())
+    if args.input is None:
+        # print the output as soon as possible since the input is prompted for
+        _machine = machine.default(map(int, map(input, repeat("Input: "))))
+        for value in _machine.execute_program(program):
+            if value is not None:
+                print(f"Output: {value}")
+    else:
+        _machine = machine.default(InputBuffer(args.input))
+        output: list[int] = []
+        try:
+            _machine.run_batch(program, output)
+        finally:
+            # keep the output produced before an error
+            sys.stdout.write("".join(f"Output: {value}\n" for value in output))
     if args.interactive:
+        if args.input is not None:
+            # prompt for input once the buffered input is used up
+            _machine.input = chain(_machine.input, map(int, map(input, repeat("Input: "))))
         repl = REPL(instruction, _machine)
         repl.cmdloop(f"Welcome the the {args.instructions.upper()} REPL, type 'help' for help")
     return 0
@@ -54,15 +70,23 @@ def main_exec(instruction: Type[AbstractInstruction[T]], machine: Type[AbstractM
 
 def main_trace(instruction: Type[AbstractInstruction[T]], machine: Type[AbstractMachine[T]], args: Namespace) -> int:
     """entry point for the trace subcommand"""
-    program = tuple(instruction.parse_program(args.file.read()))
+    program = instruction.compile_program(args.file.read())
     output: list[int] = []
-    args.input.reverse()
-    _machine = machine.default(args.input.pop() for _ in reversed(args.input))
-    sys.stderr.write(f"{_machine.state(reversed(args.input), output)}\n")
-    for value in _machine.execute_program(program):
-        if value is not None:
-            output.append(value)
-        sys.stderr.write(f"{_machine.state(reversed(args.input), output)}\n")
+    buffer = InputBuffer(args.input)
+    _machine = machine.default(buffer)
+    # writing every state on its own is slow since stderr is not buffered
+    states = [_machine.state(buffer.remaining(), output)]
+    try:
+        for value in _machine.execute_program(program):
+            if value is not None:
+                output.append(value)
+            states.append(_machine.state(buffer.remaining(), output))
+            if len(states) >= TRACE_BUFFER_SIZE:
+                sys.stderr.write("\n".join(states) + "\n")
+                states.clear()
+    finally:
+        if states:
+            sys.stderr.write("\n".join(states) + "\n")
     return 0
 
 
@@ -100,6 +124,13 @@ EXEC_PARSER.add_argument(
     action="store_true",
     help="open the REPL after executing the program"
 )
+EXEC_PARSER.add_argument(
+    "--input",
+    nargs="*",
+    type=int,
+    default=None,
+    help="input values for the program (omit to prompt for them)"
+)
 EXEC_PARSER.set_defaults(main=main_exec)
 
 TRACE_PARSER = SUBCOMMANDS.add_parser("trace", help="trace the execution of a program")
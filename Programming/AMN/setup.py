@@ -0,0 +1,11 @@
+#!/usr/bin/python3
+
+"""build script for the optional C extension"""
+
+from setuptools import Extension, setup
+
+setup(
+    ext_modules=[
+        Extension("AMN._am0", ["AMN/_am0.c"], optional=True)
+    ]
+)
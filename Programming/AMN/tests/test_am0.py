@@ -2,8 +2,22 @@
 
 """AM0 Tests"""
 
-from unittest import TestCase
-from AMN.am0 import Machine, Instruction
+from array import array
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+from typing import Any
+from AMN import InputBuffer
+from AMN.am0 import Machine, Instruction, Program, _execute, _fuse, _IMMEDIATE, _INCREMENT
+
+try:
+    from AMN._am0 import execute as _c_execute   # type: ignore
+except ImportError:
+    _c_execute = None
+
+try:
+    import numba    # type: ignore
+except ImportError:
+    numba = None
 
 
 # do not remove trailing whitespace!
@@ -52,6 +66,10 @@ class InstructionTest(TestCase):
             Instruction.parse("JMP x")
         with self.assertRaises(KeyError):
             Instruction.parse("XXX")
+        with self.assertRaises(KeyError):
+            Instruction.parse(" ADD")
+        with self.assertRaises(KeyError):
+            Instruction.parse("add")
 
     def test_parse_program(self) -> None:
         """test program parsing"""
@@ -89,6 +107,53 @@ class InstructionTest(TestCase):
         with self.assertRaises(ValueError):
             list(Instruction.parse_program("LOAD 1;\n ADD;\nJMP 3;"))
 
+    def test_compile_program(self) -> None:
+        """test program compilation"""
+        program = Instruction.compile_program(EXAMPLE_PROGRAM)
+        self.assertIsInstance(program, Program)
+        self.assertEqual(
+            list(program),
+            list(Instruction.parse_program(EXAMPLE_PROGRAM))
+        )
+        self.assertEqual(program[-1], (Instruction.WRITE, 3))
+        self.assertEqual(list(program[1:3]), [(Instruction.LIT, 1), (Instruction.STORE, 1)])
+        self.assertEqual(len(Instruction.compile_program("")), 0)
+        self.assertEqual(program.payloads[8], 20)
+        self.assertEqual(len(program), 21)
+        with self.assertRaises(IndexError):
+            program[21]
+        with self.assertRaises(IndexError):
+            program[-22]
+        self.assertEqual(len(program[::2]), 11)
+        self.assertEqual(program[8], (Instruction.JMC, 21))
+        self.assertEqual(program.constants, [1, 0])
+        self.assertEqual(program.payloads[1], 0)
+        self.assertEqual(program.payloads[3], 1)
+        self.assertEqual(program.payloads[16], 0)
+        program = Instruction.compile_program(f"LIT {2 ** 64};\nSTORE 0;\nWRITE 0;")
+        self.assertEqual(program[0], (Instruction.LIT, 2 ** 64))
+        self.assertIsInstance(program.payloads, array)
+        machine = Machine.default(iter([]))
+        self.assertEqual(list(machine.execute_program(program)), [None, None, 2 ** 64])
+
+    def test_memory_size(self) -> None:
+        """test memory size calculation"""
+        self.assertEqual(Instruction.compile_program(EXAMPLE_PROGRAM).memory_size(), 4)
+        self.assertEqual(Instruction.compile_program("LIT 42;\nJMP 9;").memory_size(), 0)
+        self.assertEqual(Instruction.compile_program("READ 0;").memory_size(), 1)
+
+    def test_fuse(self) -> None:
+        """test fusing superinstructions"""
+        program = Instruction.compile_program(
+            "LOAD 0;\nLIT 1;\nADD;\nSTORE 0;\nLOAD 0;\nLIT 1;\nADD;\nSTORE 1;\nLIT 2;\nJMP 7;\nLIT 3;\nMUL;"
+        )
+        operations = program.operations.tolist()
+        operations[0] = _INCREMENT
+        # instruction 6 is a jump target
+        operations[10] = _IMMEDIATE + Instruction.MUL.value
+        self.assertEqual(_fuse(program).tolist(), operations)
+        self.assertEqual(program.operations[0], Instruction.LOAD.value)
+
     def test_has_payload(self) -> None:
         """test payload information"""
         has_payload = {
@@ -166,10 +231,368 @@ class MachineTest(TestCase):
 
     def test_execute(self) -> None:
         """test program execution"""
-        program = tuple(Instruction.parse_program(EXAMPLE_PROGRAM))
-        machine = Machine.default(iter([2, 42]))
-        self.assertEqual(
-            list(machine.execute_program(program)),
-            [None] * 39 + [5]
-        )
+        programs = [
+            tuple(Instruction.parse_program(EXAMPLE_PROGRAM)),
+            Instruction.compile_program(EXAMPLE_PROGRAM)
+        ]
+        for program in programs:
+            machine = Machine.default(iter([2, 42]))
+            self.assertEqual(
+                list(machine.execute_program(program)),
+                [None] * 39 + [5]
+            )
+            self.assertEqual(next(machine.input), 42)
+
+    def test_halt(self) -> None:
+        """test halting by leaving the program"""
+        for source, counter in (
+            ("LIT 1;\nJMP 0;\nWRITE 0;", 0),
+            ("LIT 0;\nJMC -5;\nWRITE 0;", -5),
+            ("LIT 1;\nJMP 9;\nWRITE 0;", 9),
+            ("LIT 1;\nJMP 4;\nWRITE 0;", 4),
+            ("LIT 1;\nSTORE 0;", 3)
+        ):
+            program = Instruction.compile_program(source)
+            machine = Machine.default(iter([]))
+            counters = [machine.counter for _ in machine.execute_program(program)]
+            self.assertEqual(counters[-1], counter, f"wrong counter when executing {source!r}")
+            self.assertEqual(len(counters), 2, f"wrong number of steps when executing {source!r}")
+            for execute in (None, _execute):
+                with patch("AMN.am0._native_execute", return_value=execute):
+                    machine = Machine.default(iter([]))
+                    machine.run_batch(program, [])
+                self.assertEqual(machine.counter, counter, f"wrong counter when batch executing {source!r}")
+
+    def test_execute_instruction(self) -> None:
+        """test single instruction execution"""
+        machine = Machine.default(iter([3]))
+        self.assertIsNone(machine.execute_instruction((Instruction.READ, 0)))
+        self.assertIsNone(machine.execute_instruction((Instruction.LOAD, 0)))
+        self.assertIsNone(machine.execute_instruction((Instruction.LIT, 4)))
+        self.assertIsNone(machine.execute_instruction((Instruction.MUL, 0)))
+        self.assertIsNone(machine.execute_instruction((Instruction.STORE, 1)))
+        self.assertEqual(machine.execute_instruction((Instruction.WRITE, 1)), 12)
+        self.assertEqual(machine.counter, 7)
+        self.assertIsNone(machine.execute_instruction((Instruction.JMP, 42)))
+        self.assertEqual(machine.counter, 42)
+        with self.assertRaises(ValueError):
+            machine.execute_instruction(("ADD", 0))  # type: ignore
+
+    def test_comparison(self) -> None:
+        """test comparisons pushing integers"""
+        machine = Machine.default(iter([]))
+        for instruction, result in ((Instruction.LT, 1), (Instruction.GE, 0), (Instruction.EQ, 0)):
+            machine.execute_instruction((Instruction.LIT, 1))
+            machine.execute_instruction((Instruction.LIT, 2))
+            machine.execute_instruction((instruction, 0))
+            self.assertEqual(machine.stack, [result])
+            self.assertIs(type(machine.stack[0]), int)
+            machine.reset()
+
+    def test_run_batch(self) -> None:
+        """test batch execution"""
+        program = Instruction.compile_program(EXAMPLE_PROGRAM)
+        machine = Machine.default(iter([4, 42]))
+        output: list[int] = []
+        machine.run_batch(program, output)
+        self.assertEqual(output, [30])
+        self.assertEqual(machine.counter, 22)
+        self.assertEqual(machine.stack, [])
+        self.assertEqual(machine.memory, {2: 4, 1: 5, 3: 30})
         self.assertEqual(next(machine.input), 42)
+        machine = Machine.default(iter([4, 42]))
+        output = []
+        machine._run_program(program, output)
+        self.assertEqual(output, [30])
+        self.assertEqual(machine.counter, 22)
+        machine = Machine(6, [], {}, iter([]))
+        with self.assertRaises(KeyError):
+            machine._run_program(program, output)
+        self.assertEqual(machine.counter, 6)
+
+    def test_run_batch_input(self) -> None:
+        """test batch execution with buffered input"""
+        program = Instruction.compile_program(EXAMPLE_PROGRAM)
+        for execute in (None, _execute):
+            with patch("AMN.am0._native_execute", return_value=execute), \
+                    patch.object(Machine, "execute_instruction") as execute_instruction:
+                buffer = InputBuffer([1, 4, 42], 1)
+                machine = Machine.default(buffer)
+                output: list[int] = []
+                machine.run_batch(program, output)
+            self.assertEqual(output, [30])
+            self.assertEqual(list(buffer.remaining()), [42])
+            execute_instruction.assert_not_called()
+        buffer = InputBuffer([2 ** 64, 2, 3])
+        machine = Machine.default(buffer)
+        output = []
+        machine.run_batch(Instruction.compile_program("READ 0;\nREAD 1;\nWRITE 0;\nWRITE 1;"), output)
+        self.assertEqual(output, [2 ** 64, 2])
+        self.assertEqual(list(buffer), [3])
+
+    def test_compile_to_python(self) -> None:
+        """test executing programs compiled to Python code"""
+        sources = [
+            EXAMPLE_PROGRAM,
+            "",
+            "LIT 1;\nJMP 0;\nWRITE 0;",
+            "LIT 1;\nJMP 42;\nWRITE 0;",
+            "LIT 0;\nJMC 5;\nWRITE 0;\nJMP 8;\nLIT 3;\nSTORE 0;\nJMP 3;",
+            "LIT 1;\nLIT 0;\nJMC 4;\nJMC 0;\nLIT 5;",
+            "READ 0;\nLOAD 0;\nLIT 2;\nSUB;\nLIT 3;\nGT;\nSTORE 1;\nLOAD 0;\nLIT 7;\nADD;\nSTORE 0;\nWRITE 0;\nWRITE 1;"
+        ]
+        for source in sources:
+            program = Instruction.compile_program(source)
+            namespace: dict[str, Any] = {}
+            exec(program.compile_to_python(), namespace)
+            expected = Machine.default(iter([5]))
+            outputs = [value for value in expected.execute_program(program) if value is not None]
+            machine = Machine.default(iter([5]))
+            output: list[int] = []
+            self.assertEqual(namespace["execute"](machine, output, 0), expected.counter)
+            self.assertEqual(output, outputs)
+            self.assertEqual(machine.stack, expected.stack)
+            self.assertEqual(machine.memory, expected.memory)
+        cases = [
+            ("LIT 1;\nLIT 2;\nLOAD 0;", KeyError, 3, [1, 2]),
+            ("LIT 1;\nLIT 0;\nJMC 5;\nLIT 9;\nLOAD 0;", KeyError, 5, [1]),
+            ("LIT 4;\nLIT 0;\nDIV;", ZeroDivisionError, 3, [4, 0]),
+            ("LIT 0;\nSTORE 0;\nLOAD 1;\nLIT 1;\nADD;\nSTORE 1;", KeyError, 3, [])
+        ]
+        for source, error, counter, stack in cases:
+            machine = Machine.default(iter([]))
+            with patch("AMN.am0._native_execute", return_value=None), self.assertRaises(error):
+                machine.run_batch(Instruction.compile_program(source), [])
+            self.assertEqual(machine.counter, counter, f"wrong counter when executing {source!r}")
+            self.assertEqual(machine.stack, stack, f"wrong stack when executing {source!r}")
+        # failing input must not be repeated
+        machine = Machine.default(map(int, iter(["x", "5"])))
+        output = []
+        with patch("AMN.am0._native_execute", return_value=None), self.assertRaises(ValueError):
+            machine.run_batch(Instruction.compile_program("LIT 1;\nREAD 0;\nWRITE 0;"), output)
+        self.assertEqual(output, [])
+        self.assertEqual(machine.counter, 2)
+        self.assertEqual(next(machine.input), 5)
+
+    def test_run_batch_native(self) -> None:
+        """test batch execution on 64 bit integer buffers"""
+        source = f"LIT 1;\nLIT 3;\nSTORE 0;\nWRITE 0;\nWRITE 0;\nLIT {2 ** 62};\nLIT 4;\nMUL;\nSTORE 1;\nWRITE 1;"
+        program = Instruction.compile_program(source)
+        with patch("AMN.am0._native_execute", return_value=_execute), patch("AMN.am0.NATIVE_OUTPUT_SIZE", 1):
+            machine = Machine(1, [2], {-1: 0}, iter([]))
+            output: list[int] = []
+            machine.run_batch(program, output)
+            self.assertEqual(output, [3, 3, 2 ** 64])
+            self.assertEqual(machine.memory, {-1: 0, 0: 3, 1: 2 ** 64})
+            machine = Machine(1, [2], {5: 6}, iter([]))
+            output = []
+            machine.run_batch(program, output)
+            self.assertEqual(output, [3, 3, 2 ** 64])
+            self.assertEqual(machine.counter, len(program) + 1)
+            self.assertEqual(machine.stack, [2, 1])
+            self.assertEqual(machine.memory, {5: 6, 0: 3, 1: 2 ** 64})
+            for address in (2 ** 62, 100000000):
+                machine = Machine.default(iter([]))
+                output = []
+                machine.run_batch(Instruction.compile_program(f"LIT 7;\nSTORE {address};\nWRITE {address};"), output)
+                self.assertEqual(output, [7])
+                self.assertEqual(machine.memory, {address: 7})
+            machine = Machine.default(iter([]))
+            output = []
+            machine.run_batch(Instruction.compile_program(f"LIT {2 ** 64};\nSTORE 0;\nWRITE 0;"), output)
+            self.assertEqual(output, [2 ** 64])
+            machine = Machine.default(iter([4, 2 ** 64]))
+            output = []
+            with patch.object(Machine, "execute_instruction", autospec=True, side_effect=Machine.execute_instruction) as execute_instruction:
+                machine.run_batch(Instruction.compile_program("READ 0;\nLOAD 0;\nLIT 1;\nADD;\nSTORE 0;\nWRITE 0;\nREAD 1;\nWRITE 1;"), output)
+            self.assertEqual(output, [5, 2 ** 64])
+            self.assertEqual(execute_instruction.call_count, 2)
+            machine = Machine(1, [], {4: 0}, InputBuffer([1, 2, 3]))
+            machine.run_batch(Instruction.compile_program("READ 2;\nREAD 0;\nLIT 4;\nSTORE 4;\nREAD 2;\nLIT 5;\nSTORE 1;"), [])
+            self.assertEqual(list(machine.memory.items()), [(4, 4), (2, 3), (0, 2), (1, 5)])
+
+
+class NativeTest(TestCase):
+    """tests for the execution on 64 bit integer buffers"""
+
+    execute = staticmethod(_execute)
+
+    def test_execute(self) -> None:
+        """test executing a whole program"""
+        program = Instruction.compile_program(EXAMPLE_PROGRAM)
+        stack = array("q", [0] * 4)
+        memory = array("q", [0, 0, 0, 0])
+        defined = array("q", [0, 0, 0, 0])
+        outputs = array("q", [0])
+        registers = array("q", [0, 0, 0, 1, 0])
+        self.assertTrue(
+            self.execute(
+                program.operations,
+                program.payloads,
+                array("q", program.constants),
+                stack,
+                memory,
+                defined,
+                array("q", [42, 3]),
+                outputs,
+                registers
+            )
+        )
+        self.assertEqual(registers.tolist(), [len(program), 0, 1, 2, 3])
+        self.assertEqual(outputs.tolist(), [14])
+        self.assertEqual(memory.tolist(), [0, 4, 3, 14])
+        self.assertEqual(defined.tolist(), [0, 2, 1, 3])
+
+    def test_execute_superinstructions(self) -> None:
+        """test executing superinstructions"""
+        program = Instruction.compile_program("LOAD 0;\nLIT 5;\nADD;\nSTORE 0;\nLOAD 0;\nLIT 9;\nLT;\nWRITE 0;")
+        stack = array("q", [0, 0])
+        memory = array("q", [3])
+        registers = array("q", [0, 0, 0, 0, 0])
+        outputs = array("q", [0])
+        self.assertTrue(
+            self.execute(
+                _fuse(program),
+                program.payloads,
+                array("q", program.constants),
+                stack,
+                memory,
+                array("q", [1]),
+                array("q"),
+                outputs,
+                registers
+            )
+        )
+        self.assertEqual(registers.tolist(), [len(program), 1, 1, 0, 0])
+        self.assertEqual(stack[0], 1)
+        self.assertEqual(outputs[0], 8)
+
+    def test_arithmetic(self) -> None:
+        """test arithmetic with negative operands"""
+        for left in (-7, 7, -2 ** 63):
+            for right in (-2, 2, -1):
+                for instruction, expected in (
+                    ("MUL", left * right),
+                    ("DIV", left // right),
+                    ("MOD", left % right)
+                ):
+                    if not -2 ** 63 <= expected < 2 ** 63:
+                        continue
+                    program = Instruction.compile_program(f"LIT {left};\nLIT {right};\n{instruction};")
+                    for operations in (program.operations, _fuse(program)):
+                        stack = array("q", [0, 0])
+                        self.assertTrue(
+                            self.execute(
+                                operations,
+                                program.payloads,
+                                array("q", program.constants),
+                                stack,
+                                array("q"),
+                                array("q"),
+                                array("q"),
+                                array("q"),
+                                array("q", [0, 0, 0, 0, 0])
+                            )
+                        )
+                        self.assertEqual(stack[0], expected, f"wrong result of {left} {instruction} {right}")
+
+    def test_overflow(self) -> None:
+        """test stopping before multiplications which overflow"""
+        for left, right in (
+            (2 ** 32, 2 ** 32),
+            (-2 ** 63, 3),
+            (3, 2 ** 62),
+            (-1, -2 ** 63),
+            (-2 ** 63, -1),
+            (2 ** 62, -3)
+        ):
+            program = Instruction.compile_program(f"LIT {left};\nLIT {right};\nMUL;")
+            for operations, index in ((program.operations, 2), (_fuse(program), 1)):
+                registers = array("q", [0, 0, 0, 0, 0])
+                self.assertFalse(
+                    self.execute(
+                        operations,
+                        program.payloads,
+                        array("q", program.constants),
+                        array("q", [0, 0]),
+                        array("q"),
+                        array("q"),
+                        array("q"),
+                        array("q"),
+                        registers
+                    ),
+                    f"did not stop when multiplying {left} and {right}"
+                )
+                self.assertEqual(registers[0], index, f"wrong index when multiplying {left} and {right}")
+
+    def test_stop(self) -> None:
+        """test stopping before unsupported instructions"""
+        cases = [
+            ("READ 2;", 0, 0),
+            ("LIT 1;\nREAD 0;\nREAD 1;\nREAD 0;", 3, 1),
+            ("LIT 1;\nLOAD 0;", 1, 1),
+            ("LIT 1;\nSTORE 2;", 1, 1),
+            ("LIT 1;\nSTORE -1;", 1, 1),
+            ("LIT 1;\nLIT 2;\nLIT 3;", 2, 2),
+            ("LIT 1;\nLIT 0;\nDIV;", 2, 2),
+            ("ADD;", 0, 0),
+            (f"LIT {2 ** 63 - 1};\nLIT 1;\nADD;", 2, 2),
+            (f"LIT {-2 ** 63};\nLIT 1;\nSUB;", 2, 2),
+            (f"LIT {2 ** 62};\nLIT -2;\nMUL;\nLIT -1;\nMUL;", 4, 2),
+            ("LIT 1;\nSTORE 0;\nWRITE 0;\nWRITE 0;", 3, 0)
+        ]
+        for source, index, top in cases:
+            program = Instruction.compile_program(source)
+            registers = array("q", [0, 0, 0, 0, 0])
+            self.assertFalse(
+                self.execute(
+                    program.operations,
+                    program.payloads,
+                    array("q", program.constants),
+                    array("q", [0, 0]),
+                    array("q", [0, 0]),
+                    array("q", [0, 0]),
+                    array("q", [1, 2]),
+                    array("q", [0]),
+                    registers
+                ),
+                f"did not stop when executing {source!r}"
+            )
+            self.assertEqual(registers[0], index, f"wrong index when executing {source!r}")
+            self.assertEqual(registers[1], top, f"wrong top when executing {source!r}")
+
+
+@skipIf(numba is None, "Numba not installed")
+class NumbaTest(NativeTest):
+    """tests for the execution on 64 bit integer buffers compiled by Numba"""
+
+    execute = staticmethod(numba.njit(_execute) if numba is not None else _execute)
+
+
+@skipIf(_c_execute is None, "C extension not built")
+class CExtensionTest(NativeTest):
+    """tests for the execution on 64 bit integer buffers by the C extension"""
+
+    execute = staticmethod(_c_execute if _c_execute is not None else _execute)
+
+    def test_buffers(self) -> None:
+        """test rejecting invalid buffers"""
+        registers = array("q", [0, 0, 0, 0, 0])
+        empty = array("q")
+        with self.assertRaises(TypeError):
+            self.execute(array("B", [0]), empty, empty, empty, empty, empty, empty, empty)
+        with self.assertRaises(TypeError):
+            self.execute(array("B", [0]), array("i", [0]), empty, empty, empty, empty, empty, empty, registers)
+        with self.assertRaises(TypeError):
+            self.execute(array("B", [0]), array("q", [0]), empty, empty, empty, array("B"), empty, empty, registers)
+        with self.assertRaises(BufferError):
+            self.execute(array("B", [0]), array("q", [0]), empty, b"", empty, empty, empty, empty, registers)
+        with self.assertRaises(ValueError):
+            self.execute(array("B", [14, 0]), empty, empty, empty, empty, empty, empty, empty, registers)
+        with self.assertRaises(ValueError):
+            self.execute(array("B", [14]), array("q", [0]), empty, empty, empty, empty, empty, empty, registers)
+        with self.assertRaises(ValueError):
+            self.execute(array("B", [0]), array("q", [0]), empty, empty, empty, empty, empty, empty, array("q", [0] * 4))
+        self.assertFalse(
+            self.execute(array("B", [14, 0]), array("q", [1, 0]), array("q", [2]), array("q", [0]), empty, empty, empty, empty, registers)
+        )
@@ -219,6 +219,15 @@ class MachineTest(TestCase):
         )
         self.assertEqual(next(machine.input), 42)
 
+    def test_run_batch(self) -> None:
+        """test batch execution"""
+        program = tuple(Instruction.parse_program(EXAMPLE_PROGRAM))
+        machine = Machine.default(iter([1, 42]))
+        output: list[int] = []
+        machine.run_batch(program, output)
+        self.assertEqual(output, [2])
+        self.assertEqual(next(machine.input), 42)
+
     def test_frames(self) -> None:
         """test frame detection"""
         machine = Machine(42, [1, 2], [4, 6, 2, 0, 3, 4, 42, 4, 99], 8, iter([]))